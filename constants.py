@@ -0,0 +1 @@
+DEFAULT_COLLECTION_NAME = "insightlens_documents"
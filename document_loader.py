@@ -1,53 +1,136 @@
 import os
+import mmap
+from typing import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pypdf import PdfReader
 from docx import Document as DocxDocument
 
-def load_pdf(file_path: str) -> str:
-    text = ""
+try:
+    import pypdfium2
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+PARALLEL_PDF_MIN_PAGES = 16
+TXT_READ_BLOCK_SIZE = 1 << 20
+
+def normalize_newlines(text: str) -> str:
+    if '\r' in text:
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+def iter_pdf_pages_with_pdfium(pdf) -> Iterator[str]:
     try:
-        reader = PdfReader(file_path)
+        for page in pdf:
+            textpage = page.get_textpage()
+            yield normalize_newlines(textpage.get_text_range()) + "\n"
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+
+def extract_pypdf_page_range(file_path: str, start: int, stop: int) -> list[str]:
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def iter_pdf_pages_with_pypdf(file_path: str) -> Iterator[str]:
+    reader = PdfReader(file_path)
+    num_pages = len(reader.pages)
+    workers = min(os.cpu_count() or 1, num_pages)
+    if num_pages < PARALLEL_PDF_MIN_PAGES or workers < 2:
         for page in reader.pages:
             page_text = page.extract_text()
             if page_text:
-                text += page_text + "\n"
+                yield page_text + "\n"
+        return
+
+    step = -(-num_pages // workers)
+    starts = range(0, num_pages, step)
+    stops = [min(start + step, num_pages) for start in starts]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for page_texts in executor.map(extract_pypdf_page_range, [file_path] * len(starts), starts, stops):
+            yield from (page_text + "\n" for page_text in page_texts if page_text)
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    if PDFIUM_AVAILABLE:
+        try:
+            pdf = pypdfium2.PdfDocument(file_path)
+        except Exception as e:
+            print(f"PDFium could not read {file_path} ({e}). Falling back to pypdf.")
+        else:
+            return iter_pdf_pages_with_pdfium(pdf)
+    return iter_pdf_pages_with_pypdf(file_path)
+
+def load_pdf(file_path: str) -> str:
+    if PDFIUM_AVAILABLE:
+        try:
+            return "".join(iter_pdf_pages_with_pdfium(pypdfium2.PdfDocument(file_path)))
+        except Exception as e:
+            print(f"PDFium could not read {file_path} ({e}). Falling back to pypdf.")
+
+    try:
+        return "".join(iter_pdf_pages_with_pypdf(file_path))
     except Exception as e:
         print(f"Error reading PDF {file_path}: {e}")
         return ""
-    return text
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    doc = DocxDocument(file_path)
+    for para in doc.paragraphs:
+        yield para.text + "\n"
 
 def load_docx(file_path: str) -> str:
-    text = ""
     try:
-        doc = DocxDocument(file_path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
+        return "".join(iter_docx_paragraphs(file_path))
     except Exception as e:
         print(f"Error reading DOCX {file_path}: {e}")
         return ""
-    return text
+
+def iter_txt_blocks(file_path: str) -> Iterator[str]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from iter(lambda: f.read(TXT_READ_BLOCK_SIZE), "")
 
 def load_txt(file_path: str) -> str:
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return normalize_newlines(str(mm, 'utf-8'))
     except Exception as e:
         print(f"Error reading TXT {file_path}: {e}")
         return ""
 
-def load_document(file_path: str) -> str | None:
+def _resolve_text_iterator(file_path: str, action: str):
     _, extension = os.path.splitext(file_path.lower())
-    
+
     if not os.path.exists(file_path):
         print(f"Error: File not found at {file_path}")
         return None
 
-    print(f"Loading document: {file_path}")
+    print(f"{action} document: {file_path}")
     if extension == ".pdf":
-        return load_pdf(file_path)
+        return iter_pdf_pages
     elif extension == ".docx":
-        return load_docx(file_path)
+        return iter_docx_paragraphs
     elif extension == ".txt" or extension == ".md":
-        return load_txt(file_path)
+        return iter_txt_blocks
     else:
         print(f"Unsupported file type: {extension}")
-        return None
\ No newline at end of file
+        return None
+
+def iter_document_text(file_path: str) -> Iterator[str] | None:
+    text_iterator = _resolve_text_iterator(file_path, "Streaming")
+    return text_iterator(file_path) if text_iterator is not None else None
+
+_WHOLE_TEXT_LOADERS = {
+    iter_pdf_pages: load_pdf,
+    iter_docx_paragraphs: load_docx,
+    iter_txt_blocks: load_txt,
+}
+
+def load_document(file_path: str) -> str | None:
+    text_iterator = _resolve_text_iterator(file_path, "Loading")
+    if text_iterator is None:
+        return None
+    return _WHOLE_TEXT_LOADERS[text_iterator](file_path)
@@ -1,29 +1,167 @@
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+import numpy as np
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import hashlib
+import os
+import random
+import threading
 import time
 
-EMBEDDING_MODEL_NAME = "models/embedding-001" 
+EMBEDDING_MODEL_NAME = "models/embedding-001"
+EMBEDDING_CACHE_DIR = "./emb_cache"
+BATCH_SIZE = 100
+MAX_CONCURRENT_BATCHES = 5
+MAX_RETRIES = 3
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
 
-def get_embeddings(texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[List[float]] | None:
-    if not texts:
-        return []
-    
-    all_embeddings = []
-    BATCH_SIZE = 100 
-    for i in range(0, len(texts), BATCH_SIZE):
-        batch_texts = texts[i:i + BATCH_SIZE]
+def _retry_after_seconds(error: Exception) -> float | None:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def _embed_batch_with_retry(batch_texts: List[str], task_type: str) -> List[List[float]]:
+    for attempt in range(MAX_RETRIES + 1):
         try:
-            print(f"Generating embeddings for batch {i//BATCH_SIZE + 1} ({len(batch_texts)} texts)...")
             result = genai.embed_content(
                 model=EMBEDDING_MODEL_NAME,
                 content=batch_texts,
                 task_type=task_type
             )
-            all_embeddings.extend(result['embedding'])
-            if len(texts) > BATCH_SIZE and i + BATCH_SIZE < len(texts):
-                 time.sleep(1) 
-        except Exception as e:
-            print(f"Error generating embeddings for a batch: {e}")
-            return None 
-            
-    return all_embeddings
\ No newline at end of file
+            return result['embedding']
+        except TRANSIENT_ERRORS as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _retry_after_seconds(e) or 2 ** attempt
+            print(f"Embedding request failed ({e}). Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def _text_hash(text: str, task_type: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL_NAME}\0{task_type}\0{text}".encode('utf-8')).hexdigest()
+
+def _cache_path(text_hash: str) -> str:
+    return os.path.join(EMBEDDING_CACHE_DIR, f"{text_hash}.npy")
+
+def _load_cached_embedding(text_hash: str) -> np.ndarray | None:
+    try:
+        return np.load(_cache_path(text_hash)).astype(np.float32)
+    except (OSError, ValueError, EOFError):
+        return None
+
+def _save_cached_embedding(text_hash: str, embedding: np.ndarray):
+    path = _cache_path(text_hash)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            np.save(f, embedding.astype(np.float16))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write embedding cache entry: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+QUERY_CACHE_SIZE = 512
+_query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+def _normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+def get_query_embeddings(queries: List[str], task_type: str = "RETRIEVAL_QUERY") -> np.ndarray | None:
+    normalized = [_normalize_query(query) for query in queries]
+    query_hashes = [_text_hash(query.casefold(), task_type) for query in normalized]
+
+    found = {}
+    missing = {}
+    for query, query_hash in zip(normalized, query_hashes):
+        if query_hash in found or query_hash in missing:
+            continue
+        if query_hash in _query_cache:
+            _query_cache.move_to_end(query_hash)
+            found[query_hash] = _query_cache[query_hash]
+            continue
+        embedding = _load_cached_embedding(query_hash)
+        if embedding is not None:
+            found[query_hash] = _query_cache[query_hash] = embedding
+        else:
+            missing[query_hash] = query
+
+    if missing:
+        fetched = _fetch_embeddings(list(missing.values()), task_type)
+        if fetched is None:
+            return None
+        for query_hash, embedding in zip(missing, fetched):
+            found[query_hash] = _query_cache[query_hash] = embedding
+            _save_cached_embedding(query_hash, embedding)
+    while len(_query_cache) > QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+
+    return np.stack([found[query_hash] for query_hash in query_hashes])
+
+def get_embeddings(texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> np.ndarray | None:
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    if task_type == "RETRIEVAL_QUERY":
+        return get_query_embeddings(texts, task_type)
+
+    text_hashes = [_text_hash(text, task_type) for text in texts]
+    cached = [_load_cached_embedding(h) for h in text_hashes]
+    missing = [i for i, emb in enumerate(cached) if emb is None]
+    if len(missing) == len(texts):
+        fetched = _fetch_embeddings(texts, task_type)
+        if fetched is not None:
+            for text_hash, embedding in zip(text_hashes, fetched):
+                _save_cached_embedding(text_hash, embedding)
+        return fetched
+
+    if missing:
+        print(f"{len(texts) - len(missing)} of {len(texts)} embeddings found in local cache.")
+        fetched = _fetch_embeddings([texts[i] for i in missing], task_type)
+        if fetched is None:
+            return None
+        for i, embedding in zip(missing, fetched):
+            cached[i] = embedding
+            _save_cached_embedding(text_hashes[i], embedding)
+    else:
+        print(f"All {len(texts)} embeddings found in local cache.")
+    return np.stack(cached)
+
+def _fetch_embeddings(texts: List[str], task_type: str) -> np.ndarray | None:
+    all_embeddings = None
+    batch_starts = list(range(0, len(texts), BATCH_SIZE))
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BATCHES) as executor:
+        futures = []
+        for i in batch_starts:
+            batch_texts = texts[i:i + BATCH_SIZE]
+            print(f"Generating embeddings for batch {i//BATCH_SIZE + 1} ({len(batch_texts)} texts)...")
+            if len(texts) > BATCH_SIZE:
+                time.sleep(random.uniform(0, 0.1))
+            futures.append(executor.submit(_embed_batch_with_retry, batch_texts, task_type))
+
+        for i, future in zip(batch_starts, futures):
+            try:
+                batch_embeddings = np.asarray(future.result(), dtype=np.float32)
+            except Exception as e:
+                print(f"Error generating embeddings for a batch: {e}")
+                for pending in futures:
+                    pending.cancel()
+                return None
+            if all_embeddings is None:
+                all_embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+            all_embeddings[i:i + len(batch_embeddings)] = batch_embeddings
+
+    return all_embeddings
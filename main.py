@@ -1,33 +1,14 @@
 import typer
 from typing_extensions import Annotated
 import os
-import time
-
-from utils import load_api_key
-from document_loader import load_document
-from text_chunker import simple_chunker
-from embedding_generator import get_embeddings, EMBEDDING_MODEL_NAME
-from vector_store_manager import (
-    add_documents_to_store,
-    query_store,
-    reset_collection as reset_db_collection,
-    DEFAULT_COLLECTION_NAME
-)
-from rag_core import construct_rag_prompt, generate_answer_with_gemini
-
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-
-try:
-    from docx import Document as DocxCreator
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+import sys
+import asyncio
+import hashlib
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from constants import DEFAULT_COLLECTION_NAME
 
 
 APP_STATE = {
@@ -39,9 +20,14 @@ APP_STATE = {
     "top_k_retrieval": 3
 }
 
+LOAD_STREAM_BATCH_SIZE = 500
+SUMMARY_MAX_WORKERS = 8
+SUMMARY_MAX_RETRIES = 3
+
 app = typer.Typer(help="InsightLens: Query your documents with AI.")
 
 def ensure_api_key():
+    from utils import load_api_key
     if not APP_STATE["api_key_loaded"]:
         try:
             load_api_key()
@@ -52,54 +38,197 @@ def ensure_api_key():
             typer.secho("Please ensure your GEMINI_API_KEY is set in a .env file or as an environment variable.", fg=typer.colors.YELLOW, err=True)
             raise typer.Exit(code=1)
 
+def generate_answers_in_parallel(prompts: list[str], label: str) -> list[str | None]:
+    from rag_core import generate_answer_with_gemini
+    answers = [None] * len(prompts)
+    with ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(generate_answer_with_gemini, prompt, SUMMARY_MAX_RETRIES): i
+            for i, prompt in enumerate(prompts)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            answers[i] = future.result()
+            if answers[i]:
+                typer.echo(f"  Summarized {label} {i+1} ({done}/{len(prompts)} done).")
+            else:
+                typer.echo(f"  Skipping {label} {i+1} due to summarization error.")
+    return answers
+
+def iter_batches(items, batch_size: int):
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+def compute_document_hash(filepath: str, embedding_model: str) -> str:
+    hasher = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    hasher.update(f"|{APP_STATE['chunk_size']}|{APP_STATE['chunk_overlap']}|{embedding_model}".encode('utf-8'))
+    return hasher.hexdigest()
+
 @app.command()
 def load(
     filepath: Annotated[str, typer.Argument(help="Path to the document (PDF, DOCX, TXT).")],
     collection_name: Annotated[str, typer.Option(help="Name of the ChromaDB collection to use.")] = DEFAULT_COLLECTION_NAME,
     force_reload: Annotated[bool, typer.Option("--force-reload", "-f", help="Force reloading and re-embedding if collection already exists with this document name.")] = False
 ):
+    from document_loader import iter_document_text
+    from text_chunker import iter_paragraphs, iter_chunks
+    from embedding_generator import get_embeddings, EMBEDDING_MODEL_NAME
+    from vector_store_manager import add_documents_to_store, has_document_hash, mark_document_complete, delete_chunks, flush_faiss_index
+
     ensure_api_key()
     APP_STATE["current_collection"] = collection_name
-    raw_text = load_document(filepath)
-    if not raw_text:
+
+    doc_hash = None
+    if os.path.isfile(filepath):
+        doc_hash = compute_document_hash(filepath, EMBEDDING_MODEL_NAME)
+        if not force_reload and has_document_hash(collection_name, doc_hash):
+            APP_STATE["last_loaded_doc_path"] = filepath
+            typer.secho(f"Document '{os.path.basename(filepath)}' is unchanged and already stored in collection '{collection_name}'. Use --force-reload to re-embed it.", fg=typer.colors.GREEN)
+            return
+
+    text_pieces = iter_document_text(filepath)
+    if text_pieces is None:
         typer.secho(f"Failed to load document: {filepath}", fg=typer.colors.RED)
         raise typer.Exit(code=1)
-    
-    APP_STATE["last_loaded_doc_path"] = filepath
+
     filename = os.path.basename(filepath)
-    typer.echo(f"Document '{filename}' loaded successfully. ({len(raw_text)} characters)")
+    id_prefix = filename + "_"
+    if not delete_chunks(collection_name, where={"source_document": filename}):
+        typer.secho(f"Could not remove previously stored chunks of '{filename}'.", fg=typer.colors.RED)
+        raise typer.Exit(code=1)
+    written_ids = []
+    chunks = iter_chunks(iter_paragraphs(text_pieces), chunk_size=APP_STATE["chunk_size"], chunk_overlap=APP_STATE["chunk_overlap"])
+
+    def chunk_metadata(i: int) -> dict:
+        return {"source_document": filename, "chunk_index": i, "doc_hash": doc_hash}
+
+    def embed_and_store(batch: list[str], first_index: int) -> bool:
+        embeddings = get_embeddings(batch, task_type="RETRIEVAL_DOCUMENT")
+        if embeddings is None:
+            return False
+        indices = range(first_index, first_index + len(batch))
+        doc_ids = [id_prefix + str(i) for i in indices]
+        written_ids.extend(doc_ids)
+        return add_documents_to_store(
+            collection_name=collection_name,
+            chunks=batch,
+            embeddings=embeddings,
+            metadatas=[chunk_metadata(i) for i in indices],
+            doc_ids=doc_ids
+        )
+
+    def abort(message: str):
+        if written_ids:
+            delete_chunks(collection_name, ids=written_ids)
+        typer.secho(message, fg=typer.colors.RED)
+        raise typer.Exit(code=1)
 
-    chunks = simple_chunker(raw_text, chunk_size=APP_STATE["chunk_size"], chunk_overlap=APP_STATE["chunk_overlap"])
-    if not chunks:
+    num_chunks = 0
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = None
+            for batch in iter_batches(chunks, LOAD_STREAM_BATCH_SIZE):
+                if pending is not None and not pending.result():
+                    abort("Failed to embed or store document chunks.")
+                typer.echo(f"Embedding and storing chunks {num_chunks + 1}-{num_chunks + len(batch)}...")
+                pending = executor.submit(embed_and_store, batch, num_chunks)
+                num_chunks += len(batch)
+            if pending is not None and not pending.result():
+                abort("Failed to embed or store document chunks.")
+    except typer.Exit:
+        raise
+    except Exception as e:
+        abort(f"Failed to load document: {filepath} ({e})")
+
+    if num_chunks == 0:
         typer.secho("Failed to chunk document or document is empty.", fg=typer.colors.RED)
         raise typer.Exit(code=1)
-    typer.echo(f"Document split into {len(chunks)} chunks.")
 
-    embeddings = get_embeddings(chunks, task_type="RETRIEVAL_DOCUMENT")
-    if not embeddings:
-        typer.secho("Failed to generate embeddings for chunks.", fg=typer.colors.RED)
-        raise typer.Exit(code=1)
-    typer.echo(f"Generated {len(embeddings)} embeddings using model '{EMBEDDING_MODEL_NAME}'.")
-
-    metadatas = [{"source_document": filename, "chunk_index": i} for i in range(len(chunks))]
-    chunk_ids = [f"{filename}_{i}" for i in range(len(chunks))]
-
-    add_documents_to_store(
-        collection_name=collection_name,
-        chunks=chunks,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        doc_ids=chunk_ids
-    )
+    if doc_hash is not None and not mark_document_complete(collection_name, id_prefix + "0", chunk_metadata(0), num_chunks):
+        abort("Failed to record the stored document as complete.")
+
+    flush_faiss_index(collection_name)
+    APP_STATE["last_loaded_doc_path"] = filepath
+    typer.echo(f"Generated {num_chunks} embeddings using model '{EMBEDDING_MODEL_NAME}'.")
     typer.secho(f"Document '{filename}' processed and stored in collection '{collection_name}'.", fg=typer.colors.GREEN)
 
+def answer_query(query: str, query_embedding, collection_name: str, persona: str | None, top_k: int, use_mmr: bool) -> bool:
+    from vector_store_manager import query_store
+    from rag_core import construct_rag_prompt, generate_answer_with_gemini
+
+    typer.echo(f"Retrieving top {top_k} relevant context chunks from collection '{collection_name}'...")
+    context_chunks = query_store(collection_name, query_embedding, top_k=top_k, use_mmr=use_mmr)
+
+    if not context_chunks:
+        typer.secho(f"No relevant context found in collection '{collection_name}' for your query.", fg=typer.colors.YELLOW)
+        typer.secho("Consider loading relevant documents or refining your query.", fg=typer.colors.YELLOW)
+        return False
+
+    typer.echo(f"Retrieved {len(context_chunks)} context chunks. Constructing prompt for Gemini...")
+    prompt = construct_rag_prompt(query, context_chunks, persona=persona)
+    
+    typer.echo("Asking Gemini...")
+    answer = generate_answer_with_gemini(prompt)
+
+    if answer:
+        typer.echo("\n🤖 InsightLens says:")
+        typer.secho(answer, fg=typer.colors.CYAN)
+        return True
+    typer.secho("InsightLens could not generate an answer. There might have been an API issue or the content was filtered.", fg=typer.colors.RED)
+    return False
+
+async def run_query_repl(handle_batch, flush_interval: float):
+    queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+
+    def read_lines():
+        try:
+            while True:
+                line = sys.stdin.readline()
+                if not line or line.strip().lower() in ("exit", "quit"):
+                    loop.call_soon_threadsafe(queue.put_nowait, None)
+                    return
+                if line.strip():
+                    loop.call_soon_threadsafe(queue.put_nowait, line.strip())
+        except RuntimeError:
+            return
+
+    threading.Thread(target=read_lines, daemon=True).start()
+    finished = False
+    while not finished:
+        first = await queue.get()
+        if first is None:
+            break
+        batch = [first]
+        deadline = loop.time() + flush_interval
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                finished = True
+                break
+            batch.append(item)
+        await asyncio.to_thread(handle_batch, batch)
+
 @app.command()
 def ask(
     query: Annotated[str, typer.Argument(help="Your question about the loaded document(s).")],
     collection_name: Annotated[str, typer.Option(help="Name of the ChromaDB collection to query.")] = DEFAULT_COLLECTION_NAME,
     persona: Annotated[str, typer.Option(help="Optional persona for the AI (e.g., 'a domain expert', 'a curious child').")] = None,
-    top_k: Annotated[int, typer.Option(help="Number of relevant chunks to retrieve.")] = None
+    top_k: Annotated[int, typer.Option(help="Number of relevant chunks to retrieve.")] = None,
+    mmr: Annotated[bool, typer.Option("--mmr", help="Re-rank retrieved chunks with MMR to reduce redundant context.")] = False
 ):
+    from embedding_generator import get_embeddings, EMBEDDING_MODEL_NAME
+
     ensure_api_key()
     if top_k is None:
         top_k = APP_STATE["top_k_retrieval"]
@@ -108,31 +237,43 @@ def ask(
     typer.echo(f"Embedding your query using '{EMBEDDING_MODEL_NAME}'...")
     query_embedding_list = get_embeddings([query], task_type="RETRIEVAL_QUERY")
     
-    if not query_embedding_list or not query_embedding_list[0]:
+    if query_embedding_list is None or len(query_embedding_list) == 0:
         typer.secho("Failed to generate embedding for your query.", fg=typer.colors.RED)
         raise typer.Exit(code=1)
     query_embedding = query_embedding_list[0]
     typer.echo("Query embedded successfully.")
 
-    typer.echo(f"Retrieving top {top_k} relevant context chunks from collection '{collection_name}'...")
-    context_chunks = query_store(collection_name, query_embedding, top_k=top_k)
+    answer_query(query, query_embedding, collection_name, persona, top_k, mmr)
 
-    if not context_chunks:
-        typer.secho(f"No relevant context found in collection '{collection_name}' for your query.", fg=typer.colors.YELLOW)
-        typer.secho("Consider loading relevant documents or refining your query.", fg=typer.colors.YELLOW)
-        return
+@app.command()
+def ask_repl(
+    collection_name: Annotated[str, typer.Option(help="Name of the ChromaDB collection to query.")] = DEFAULT_COLLECTION_NAME,
+    persona: Annotated[str, typer.Option(help="Optional persona for the AI (e.g., 'a domain expert', 'a curious child').")] = None,
+    top_k: Annotated[int, typer.Option(help="Number of relevant chunks to retrieve.")] = None,
+    mmr: Annotated[bool, typer.Option("--mmr", help="Re-rank retrieved chunks with MMR to reduce redundant context.")] = False,
+    flush_interval: Annotated[float, typer.Option(help="Seconds to wait for more questions before embedding a batch.")] = 0.05
+):
+    from embedding_generator import get_embeddings
 
-    typer.echo(f"Retrieved {len(context_chunks)} context chunks. Constructing prompt for Gemini...")
-    prompt = construct_rag_prompt(query, context_chunks, persona=persona)
-    
-    typer.echo("Asking Gemini...")
-    answer = generate_answer_with_gemini(prompt)
+    ensure_api_key()
+    if top_k is None:
+        top_k = APP_STATE["top_k_retrieval"]
+    APP_STATE["current_collection"] = collection_name
 
-    if answer:
-        typer.echo("\n🤖 InsightLens says:")
-        typer.secho(answer, fg=typer.colors.CYAN)
-    else:
-        typer.secho("InsightLens could not generate an answer. There might have been an API issue or the content was filtered.", fg=typer.colors.RED)
+    def handle_batch(queries: list[str]):
+        query_embeddings = get_embeddings(queries, task_type="RETRIEVAL_QUERY")
+        if query_embeddings is None:
+            typer.secho("Failed to generate embeddings for your questions.", fg=typer.colors.RED)
+            return
+        for query, query_embedding in zip(queries, query_embeddings):
+            typer.secho(f"\n❓ {query}", bold=True)
+            answer_query(query, query_embedding, collection_name, persona, top_k, mmr)
+
+    typer.echo("Enter one question per line. Type 'exit' or press Ctrl-D to quit.")
+    try:
+        asyncio.run(run_query_repl(handle_batch, flush_interval))
+    except KeyboardInterrupt:
+        typer.echo("")
 
 @app.command()
 def summarize_doc(
@@ -141,6 +282,10 @@ def summarize_doc(
     max_chunks_to_summarize: Annotated[int, typer.Option(help="Max document chunks to process for summarization (0 for all).")] = 0,
     chunk_summary_batch_size: Annotated[int, typer.Option(help="How many chunk summaries to combine for final summary prompt.")] = 5
 ):
+    from document_loader import load_document
+    from text_chunker import simple_chunker
+    from rag_core import generate_answer_with_gemini
+
     ensure_api_key()
     
     filename = os.path.basename(filepath)
@@ -161,22 +306,32 @@ def summarize_doc(
     
     typer.echo(f"Processing {len(full_doc_chunks)} chunks for initial summarization...")
 
-    chunk_summaries = []
-    for i, chunk_text in enumerate(full_doc_chunks):
-        prompt = f"Please provide a concise summary of the following text excerpt from a larger document:\n\n---\n{chunk_text}\n---\n\nSummary:"
-        typer.echo(f"  Summarizing chunk {i+1}/{len(full_doc_chunks)}...")
-        summary_part = generate_answer_with_gemini(prompt)
-        if summary_part:
-            chunk_summaries.append(summary_part)
-        else:
-            typer.echo(f"  Skipping chunk {i+1} due to summarization error.")
-        if len(full_doc_chunks) > 10 and i < len(full_doc_chunks) -1 :
-             time.sleep(0.5)
+    chunk_prompts = [
+        f"Please provide a concise summary of the following text excerpt from a larger document:\n\n---\n{chunk_text}\n---\n\nSummary:"
+        for chunk_text in full_doc_chunks
+    ]
+    chunk_summaries = [summary for summary in generate_answers_in_parallel(chunk_prompts, "chunk") if summary]
 
     if not chunk_summaries:
         typer.secho("No chunk summaries were generated. Cannot create final summary.", fg=typer.colors.RED)
         raise typer.Exit(code=1)
 
+    batch_size = max(chunk_summary_batch_size, 2)
+    while len(chunk_summaries) > batch_size:
+        typer.echo(f"Combining {len(chunk_summaries)} summaries in groups of {batch_size}...")
+        group_prompts = [
+            "The following are summaries of consecutive sections from a larger document.\n"
+            "Please merge them into a single concise summary that preserves the main points.\n\n---\n"
+            + "\n\n---\n\n".join(chunk_summaries[i:i + batch_size])
+            + "\n---\n\nSummary:"
+            for i in range(0, len(chunk_summaries), batch_size)
+        ]
+        group_summaries = [summary for summary in generate_answers_in_parallel(group_prompts, "group") if summary]
+        if not group_summaries:
+            typer.secho("Failed to combine chunk summaries.", fg=typer.colors.RED)
+            raise typer.Exit(code=1)
+        chunk_summaries = group_summaries
+
     typer.echo(f"Generated {len(chunk_summaries)} chunk summaries. Combining them for the final summary...")
     combined_chunk_summaries_text = "\n\n---\n\n".join(chunk_summaries)
     
@@ -204,7 +359,11 @@ Comprehensive Overall Summary of '{filename}':
     if output_format != "text":
         output_filename_base = os.path.splitext(filename)[0] + "_summary"
         if output_format == "pdf":
-            if not REPORTLAB_AVAILABLE:
+            try:
+                from reportlab.lib.pagesizes import letter
+                from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+                from reportlab.lib.styles import getSampleStyleSheet
+            except ImportError:
                 typer.secho("ReportLab library not found. Cannot create PDF. Please install it: pip install reportlab", fg=typer.colors.RED)
                 raise typer.Exit(code=1)
             pdf_filename = f"{output_filename_base}.pdf"
@@ -224,7 +383,9 @@ Comprehensive Overall Summary of '{filename}':
                 typer.secho(f"Error saving PDF: {e}", fg=typer.colors.RED)
 
         elif output_format == "docx":
-            if not DOCX_AVAILABLE:
+            try:
+                from docx import Document as DocxCreator
+            except ImportError:
                 typer.secho("python-docx library not found. Cannot create DOCX. Please install it: pip install python-docx", fg=typer.colors.RED)
                 raise typer.Exit(code=1)
             docx_filename = f"{output_filename_base}.docx"
@@ -267,6 +428,8 @@ def reset_collection(
     collection_name: Annotated[str, typer.Argument(help="Name of the ChromaDB collection to reset (delete and recreate).")],
     confirm: Annotated[bool, typer.Option(prompt="Are you sure you want to delete all data in this collection?", help="Confirm deletion.")] = False
 ):
+    from vector_store_manager import reset_collection as reset_db_collection
+
     ensure_api_key()
     if not confirm:
         typer.echo("Reset cancelled.", fg=typer.colors.YELLOW)
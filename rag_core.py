@@ -1,5 +1,7 @@
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from typing import List, Dict, Any
+import time
 
 GENERATION_MODEL_NAME = "gemini-2.0-flash" 
 
@@ -25,10 +27,17 @@ Answer:
 """
     return prompt
 
-def generate_answer_with_gemini(prompt: str) -> str | None:
+def generate_answer_with_gemini(prompt: str, max_retries: int = 0) -> str | None:
     try:
         model = genai.GenerativeModel(GENERATION_MODEL_NAME)
-        response = model.generate_content(prompt)
+        for attempt in range(max_retries + 1):
+            try:
+                response = model.generate_content(prompt)
+                break
+            except google_exceptions.ResourceExhausted:
+                if attempt == max_retries:
+                    raise
+                time.sleep(2 ** attempt)
         
         if not response.candidates or not response.candidates[0].content.parts:
             block_reason = "Unknown reason"
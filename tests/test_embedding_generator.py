@@ -0,0 +1,64 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+DEPENDENCIES_AVAILABLE = module_available("numpy") and module_available("google.generativeai")
+
+if DEPENDENCIES_AVAILABLE:
+    import numpy as np
+    import embedding_generator
+    from embedding_generator import get_embeddings, _save_cached_embedding, _text_hash
+
+
+def fake_embed_content(model, content, task_type):
+    time.sleep((10 - int(content[0])) * 0.01)
+    return {"embedding": [[float(text), 1.0] for text in content]}
+
+
+@unittest.skipUnless(DEPENDENCIES_AVAILABLE, "numpy and google-generativeai are not installed")
+class GetEmbeddingsTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        for name, value in (("EMBEDDING_CACHE_DIR", cache_dir.name), ("BATCH_SIZE", 2)):
+            patcher = mock.patch.object(embedding_generator, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.texts = [str(i) for i in range(10)]
+
+    def test_out_of_order_batches_keep_input_order(self):
+        with mock.patch.object(embedding_generator.genai, "embed_content", side_effect=fake_embed_content):
+            embeddings = get_embeddings(self.texts)
+        self.assertEqual(embeddings[:, 0].tolist(), [float(text) for text in self.texts])
+
+    def test_cache_hits_and_misses_keep_input_order(self):
+        cached = {"1", "3", "4", "8"}
+        for text in cached:
+            _save_cached_embedding(_text_hash(text, "RETRIEVAL_DOCUMENT"), np.array([100 + int(text), 0.0]))
+
+        with mock.patch.object(embedding_generator.genai, "embed_content", side_effect=fake_embed_content) as embed:
+            embeddings = get_embeddings(self.texts)
+
+        requested = [text for call in embed.call_args_list for text in call.kwargs["content"]]
+        self.assertEqual(sorted(requested), [text for text in self.texts if text not in cached])
+        self.assertEqual(
+            embeddings[:, 0].tolist(),
+            [100.0 + int(text) if text in cached else float(text) for text in self.texts],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
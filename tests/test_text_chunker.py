@@ -0,0 +1,27 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_chunker import iter_chunks, iter_paragraphs, simple_chunker
+
+
+class IterParagraphsTest(unittest.TestCase):
+    def test_matches_simple_chunker_across_piece_boundaries(self):
+        text = "first para\nstill first\n\n\nsecond\n\nthird  \n \n same third\n\n\n\nfourth"
+        for size in range(1, 8):
+            pieces = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(
+                list(iter_chunks(iter_paragraphs(pieces), chunk_size=20, chunk_overlap=5)),
+                simple_chunker(text, chunk_size=20, chunk_overlap=5),
+            )
+
+    def test_many_pieces_without_blank_lines(self):
+        pages = ["line of text on a page\n" * 40] * 4000
+        chunks = list(iter_chunks(iter_paragraphs(pages)))
+        self.assertEqual(chunks, simple_chunker("".join(pages)))
+
+
+if __name__ == "__main__":
+    unittest.main()
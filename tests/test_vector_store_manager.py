@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+if NUMPY_AVAILABLE:
+    from vector_store_manager import _mmr_select
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "numpy is not installed")
+class MmrSelectTest(unittest.TestCase):
+    def test_prefers_diverse_candidate_over_near_duplicate(self):
+        candidates = [[1.0, 0.0], [0.99, 0.14], [0.0, 1.0]]
+        self.assertEqual(_mmr_select([1.0, 0.0], candidates, top_k=2, mmr_lambda=0.3), [0, 2])
+
+    def test_pure_relevance_keeps_similarity_order(self):
+        candidates = [[0.0, 1.0], [1.0, 0.0], [0.99, 0.14]]
+        self.assertEqual(_mmr_select([1.0, 0.0], candidates, top_k=3, mmr_lambda=1.0), [1, 2, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,38 +1,66 @@
 import re
+from typing import Iterable, Iterator
 
-def simple_chunker(text: str, chunk_size: int = 1000, chunk_overlap: int = 150) -> list[str]:
-    if not text:
-        return []
+def _window_offsets(n: int, chunk_size: int, chunk_overlap: int) -> zip:
+    step = chunk_size - chunk_overlap
+    return zip(range(0, n, step), range(chunk_size, n + chunk_size, step))
 
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    
-    all_chunks = []
-    current_chunk = ""
+def _split_windows(text: str, chunk_size: int, chunk_overlap: int) -> list[str]:
+    if len(text) <= chunk_size:
+        return [text]
+    windows = (text[start:end] for start, end in _window_offsets(len(text), chunk_size, chunk_overlap))
+    return [window for window in windows if window.strip()]
 
-    for paragraph in paragraphs:
-        if len(current_chunk) + len(paragraph) + 1 < chunk_size:
-            current_chunk += (" " if current_chunk else "") + paragraph
+def _join_stripped(parts: list[str]) -> Iterator[str]:
+    paragraph = "".join(parts).strip()
+    if paragraph:
+        yield paragraph
+
+def iter_paragraphs(text_pieces: Iterable[str]) -> Iterator[str]:
+    pending = []
+    prev_ends_with_newline = False
+    for piece in text_pieces:
+        if not piece:
+            continue
+        if prev_ends_with_newline and piece[0] == '\n':
+            yield from _join_stripped(pending)
+            pending = []
+        parts = piece.split('\n\n')
+        if len(parts) > 1:
+            pending.append(parts[0])
+            yield from _join_stripped(pending)
+            yield from (p for p in map(str.strip, parts[1:-1]) if p)
+            pending = [parts[-1]]
         else:
-            if current_chunk:
-                if len(current_chunk) > chunk_size:
-                    for i in range(0, len(current_chunk), chunk_size - chunk_overlap):
-                        all_chunks.append(current_chunk[i:i + chunk_size])
-                else:
-                    all_chunks.append(current_chunk)
-                current_chunk = paragraph
-            else:
-                current_chunk = paragraph
-
-            if len(current_chunk) > chunk_size:
-                for i in range(0, len(current_chunk), chunk_size - chunk_overlap):
-                    all_chunks.append(current_chunk[i:i + chunk_size])
-                current_chunk = "" 
-
-    if current_chunk:
-        if len(current_chunk) > chunk_size:
-            for i in range(0, len(current_chunk), chunk_size - chunk_overlap):
-                all_chunks.append(current_chunk[i:i + chunk_size])
+            pending.append(piece)
+        prev_ends_with_newline = piece[-1] == '\n'
+    yield from _join_stripped(pending)
+
+def iter_chunks(paragraphs: Iterable[str], chunk_size: int = 1000, chunk_overlap: int = 150) -> Iterator[str]:
+    current_parts = []
+    current_len = 0
+
+    for paragraph in paragraphs:
+        if current_len + len(paragraph) + 1 < chunk_size:
+            current_len += len(paragraph) + (1 if current_parts else 0)
+            current_parts.append(paragraph)
+            continue
+
+        if current_parts:
+            yield from _split_windows(" ".join(current_parts), chunk_size, chunk_overlap)
+
+        if len(paragraph) > chunk_size:
+            yield from _split_windows(paragraph, chunk_size, chunk_overlap)
+            current_parts = []
+            current_len = 0
         else:
-            all_chunks.append(current_chunk)
-            
-    return [chunk for chunk in all_chunks if chunk.strip()]
\ No newline at end of file
+            current_parts = [paragraph]
+            current_len = len(paragraph)
+
+    if current_parts:
+        yield from _split_windows(" ".join(current_parts), chunk_size, chunk_overlap)
+
+def simple_chunker(text: str, chunk_size: int = 1000, chunk_overlap: int = 150) -> list[str]:
+    if not text:
+        return []
+    return list(iter_chunks(iter_paragraphs([text]), chunk_size, chunk_overlap))
@@ -1,34 +1,174 @@
-import chromadb
+import numpy as np
 from typing import List, Dict, Any
+from functools import lru_cache
+import importlib.util
 import uuid
+import json
 import os
 
+from constants import DEFAULT_COLLECTION_NAME
+
+FAISS_AVAILABLE = importlib.util.find_spec("faiss") is not None
+
 PERSISTENT_DB_PATH = "./chroma_db_data"
-CHROMA_CLIENT = chromadb.PersistentClient(path=PERSISTENT_DB_PATH)
-print(f"INFO: ChromaDB PersistentClient initialized at path: {PERSISTENT_DB_PATH}")
 
-DEFAULT_COLLECTION_NAME = "insightlens_documents"
+@lru_cache(maxsize=None)
+def _get_client():
+    import chromadb
+    client = chromadb.PersistentClient(path=PERSISTENT_DB_PATH)
+    print(f"INFO: ChromaDB PersistentClient initialized at path: {PERSISTENT_DB_PATH}")
+    return client
+
+ADD_BATCH_SIZE = 500
+EMBEDDING_DTYPE = np.float32
+FAISS_MAX_COLLECTION_SIZE = 10_000
+MMR_CANDIDATE_MULTIPLIER = 4
+
+def _faiss_paths(collection_name: str) -> tuple[str, str]:
+    base = os.path.join(PERSISTENT_DB_PATH, f"{collection_name}.faiss")
+    return base, base + ".ids.json"
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def _mmr_select(query_embedding: List[float], candidate_embeddings, top_k: int, mmr_lambda: float) -> List[int]:
+    candidates = _normalized(np.asarray(candidate_embeddings, dtype=EMBEDDING_DTYPE))
+    query = _normalized(np.asarray([query_embedding], dtype=EMBEDDING_DTYPE))[0]
+    query_sim = candidates @ query
+    candidate_sim = candidates @ candidates.T
+
+    available = np.ones(len(candidates), dtype=bool)
+    redundancy = np.zeros(len(candidates), dtype=EMBEDDING_DTYPE)
+    selected = []
+    for _ in range(min(top_k, len(candidates))):
+        scores = np.where(available, mmr_lambda * query_sim - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        redundancy = candidate_sim[:, best] if not selected else np.maximum(redundancy, candidate_sim[:, best])
+        selected.append(best)
+        available[best] = False
+    return selected
+
+_faiss_cache: Dict[str, Dict[str, Any]] = {}
+
+def _get_faiss_state(collection_name: str) -> Dict[str, Any] | None:
+    if collection_name in _faiss_cache:
+        return _faiss_cache[collection_name]
+    import faiss
+    index_path, ids_path = _faiss_paths(collection_name)
+    if not os.path.exists(index_path) or not os.path.exists(ids_path):
+        return None
+    with open(ids_path, 'r', encoding='utf-8') as f:
+        ids = json.load(f)
+    index = faiss.read_index(index_path)
+    if index.ntotal != len(ids):
+        return None
+    state = {"index": index, "ids": ids, "id_set": set(ids), "dirty": False}
+    _faiss_cache[collection_name] = state
+    return state
+
+def _rebuild_faiss_state(collection) -> Dict[str, Any] | None:
+    import faiss
+    stored = collection.get(include=['embeddings'])
+    if stored.get('embeddings') is None or len(stored['ids']) == 0:
+        return None
+    vectors = np.asarray(stored['embeddings'], dtype=EMBEDDING_DTYPE)
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(_normalized(vectors))
+    ids = list(stored['ids'])
+    return {"index": index, "ids": ids, "id_set": set(ids), "dirty": True}
+
+def _update_faiss_index(collection, collection_name: str, embeddings: np.ndarray, doc_ids: List[str]):
+    count = collection.count()
+    if count >= FAISS_MAX_COLLECTION_SIZE:
+        _delete_faiss_index(collection_name)
+        return
+
+    state = _get_faiss_state(collection_name)
+    new_rows = [] if state is None else [i for i, doc_id in enumerate(doc_ids) if doc_id not in state["id_set"]]
+    if state is None or state["index"].ntotal + len(new_rows) != count:
+        state = _rebuild_faiss_state(collection)
+        if state is None:
+            _delete_faiss_index(collection_name)
+            return
+    elif new_rows:
+        state["index"].add(_normalized(embeddings[new_rows]))
+        new_ids = [doc_ids[i] for i in new_rows]
+        state["ids"].extend(new_ids)
+        state["id_set"].update(new_ids)
+        state["dirty"] = True
+    _faiss_cache[collection_name] = state
+
+def flush_faiss_index(collection_name: str):
+    state = _faiss_cache.get(collection_name)
+    if not FAISS_AVAILABLE or state is None or not state["dirty"]:
+        return
+    import faiss
+    index_path, ids_path = _faiss_paths(collection_name)
+    try:
+        faiss.write_index(state["index"], index_path)
+        with open(ids_path, 'w', encoding='utf-8') as f:
+            json.dump(state["ids"], f)
+        state["dirty"] = False
+    except Exception as e:
+        print(f"WARNING: Could not save FAISS index for '{collection_name}': {e}")
+        _delete_faiss_index(collection_name)
+
+def _delete_faiss_index(collection_name: str):
+    _faiss_cache.pop(collection_name, None)
+    for path in _faiss_paths(collection_name):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _query_faiss(collection, collection_name: str, query_embedding: List[float], top_k: int, count: int) -> List[Dict[str, Any]] | None:
+    state = _get_faiss_state(collection_name)
+    if state is None or state["index"].ntotal != count:
+        return None
+    index, ids = state["index"], state["ids"]
+    query = _normalized(np.asarray([query_embedding], dtype=EMBEDDING_DTYPE))
+    similarities, rows = index.search(query, min(top_k, count))
+    hit_ids = [ids[row] for row in rows[0] if row >= 0]
+    stored = collection.get(ids=hit_ids, include=['documents', 'metadatas'])
+    by_id = {
+        doc_id: (doc, meta)
+        for doc_id, doc, meta in zip(stored['ids'], stored['documents'], stored['metadatas'])
+    }
+    processed_results = []
+    for doc_id, similarity in zip(hit_ids, similarities[0]):
+        doc, meta = by_id.get(doc_id, (None, None))
+        if doc is not None:
+            processed_results.append({
+                "document": doc,
+                "metadata": meta or {},
+                "distance": float(2 - 2 * similarity),
+            })
+    return processed_results
+
+_collection_cache: Dict[str, Any] = {}
 
 def get_or_create_collection(collection_name: str = DEFAULT_COLLECTION_NAME):
+    if collection_name in _collection_cache:
+        return _collection_cache[collection_name]
     try:
-        collection = CHROMA_CLIENT.get_collection(name=collection_name)
+        collection = _get_client().get_collection(name=collection_name)
         print(f"INFO: Using existing ChromaDB collection: '{collection_name}'")
     except Exception as e:
         print(f"INFO: Collection '{collection_name}' not found or error getting it: {e}. Creating new collection.")
-        collection = CHROMA_CLIENT.create_collection(name=collection_name)
+        collection = _get_client().create_collection(name=collection_name)
         print(f"INFO: ChromaDB collection '{collection_name}' created.")
+    _collection_cache[collection_name] = collection
     return collection
 
 def add_documents_to_store(
     collection_name: str,
     chunks: List[str],
-    embeddings: List[List[float]],
+    embeddings: List[List[float]] | np.ndarray,
     metadatas: List[Dict[str, Any]] | None = None,
     doc_ids: List[str] | None = None
-):
-    if not chunks or not embeddings or len(chunks) != len(embeddings):
+) -> bool:
+    if not chunks or embeddings is None or len(embeddings) == 0 or len(chunks) != len(embeddings):
         print("ERROR: Chunks and embeddings must be non-empty and of the same length.")
-        return
+        return False
 
     collection = get_or_create_collection(collection_name)
 
@@ -48,26 +188,39 @@ def add_documents_to_store(
             padded_metadatas.append({})
         metadatas = padded_metadatas[:len(chunks)]
 
+    embeddings = np.asarray(embeddings, dtype=EMBEDDING_DTYPE)
     try:
-        collection.add(
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadatas,
-            ids=doc_ids
-        )
+        for i in range(0, len(chunks), ADD_BATCH_SIZE):
+            collection.add(
+                embeddings=embeddings[i:i + ADD_BATCH_SIZE],
+                documents=chunks[i:i + ADD_BATCH_SIZE],
+                metadatas=metadatas[i:i + ADD_BATCH_SIZE],
+                ids=doc_ids[i:i + ADD_BATCH_SIZE]
+            )
+        if FAISS_AVAILABLE:
+            try:
+                _update_faiss_index(collection, collection_name, embeddings, doc_ids)
+            except Exception as e:
+                print(f"WARNING: Could not update FAISS index for '{collection_name}': {e}")
+                _delete_faiss_index(collection_name)
         print(f"INFO: Added/updated {len(chunks)} chunks in collection '{collection_name}'.")
         print(f"INFO: Current count in collection '{collection_name}': {collection.count()}")
+        return True
     except Exception as e:
         print(f"ERROR: Error adding/updating documents in ChromaDB: {e}")
+        return False
 
 def query_store(
     collection_name: str,
-    query_embedding: List[float],
-    top_k: int = 5
+    query_embedding: List[float] | np.ndarray,
+    top_k: int = 5,
+    use_mmr: bool = False,
+    mmr_lambda: float = 0.5
 ) -> List[Dict[str, Any]] | None:
     try:
         collection = get_or_create_collection(collection_name)
-        if collection.count() == 0:
+        count = collection.count()
+        if count == 0:
             print(f"WARNING: Collection '{collection_name}' is empty. Cannot query.")
             return []
             
@@ -75,11 +228,21 @@ def query_store(
         print(f"ERROR: Could not get or create collection '{collection_name}' for query: {e}")
         return None
 
+    if FAISS_AVAILABLE and not use_mmr and count < FAISS_MAX_COLLECTION_SIZE:
+        try:
+            faiss_results = _query_faiss(collection, collection_name, query_embedding, top_k, count)
+            if faiss_results is not None:
+                return faiss_results
+        except Exception as e:
+            print(f"WARNING: FAISS lookup failed ({e}). Falling back to ChromaDB query.")
+
     try:
+        n_candidates = top_k * MMR_CANDIDATE_MULTIPLIER if use_mmr else top_k
+        include = ['documents', 'metadatas', 'distances'] + (['embeddings'] if use_mmr else [])
         results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k, collection.count()),
-            include=['documents', 'metadatas', 'distances']
+            query_embeddings=np.asarray([query_embedding], dtype=EMBEDDING_DTYPE),
+            n_results=min(n_candidates, count),
+            include=include
         )
         
         if not results or not results.get('ids') or not results['ids'][0]:
@@ -88,8 +251,11 @@ def query_store(
 
         processed_results = []
         num_results_retrieved = len(results['ids'][0])
+        order = range(num_results_retrieved)
+        if use_mmr and results.get('embeddings') is not None:
+            order = _mmr_select(query_embedding, results['embeddings'][0], top_k, mmr_lambda)
 
-        for i in range(num_results_retrieved):
+        for i in order:
             doc = results['documents'][0][i] if results.get('documents') and results['documents'][0] else None
             meta = results['metadatas'][0][i] if results.get('metadatas') and results['metadatas'][0] else {}
             dist = results['distances'][0][i] if results.get('distances') and results['distances'][0] else None
@@ -110,17 +276,60 @@ def query_store(
         print(f"ERROR: Error querying ChromaDB collection '{collection_name}': {e}")
         return None
 
+def has_document_hash(collection_name: str, doc_hash: str) -> bool:
+    try:
+        collection = get_or_create_collection(collection_name)
+        marker = collection.get(
+            where={"$and": [{"doc_hash": doc_hash}, {"doc_chunk_count": {"$gt": 0}}]},
+            limit=1,
+            include=['metadatas']
+        )
+        if not marker or not marker.get('ids'):
+            return False
+        meta = marker['metadatas'][0]
+        stored = collection.get(
+            where={"$and": [{"doc_hash": doc_hash}, {"source_document": meta.get("source_document")}]},
+            include=[]
+        )
+        return len(stored['ids']) == meta["doc_chunk_count"]
+    except Exception as e:
+        print(f"WARNING: Could not check collection '{collection_name}' for existing document: {e}")
+        return False
+
+def mark_document_complete(collection_name: str, doc_id: str, metadata: Dict[str, Any], chunk_count: int) -> bool:
+    try:
+        collection = get_or_create_collection(collection_name)
+        collection.update(ids=[doc_id], metadatas=[{**metadata, "doc_chunk_count": chunk_count}])
+        return True
+    except Exception as e:
+        print(f"ERROR: Could not mark document as complete in '{collection_name}': {e}")
+        return False
+
+def delete_chunks(collection_name: str, ids: List[str] | None = None, where: Dict[str, Any] | None = None) -> bool:
+    try:
+        collection = get_or_create_collection(collection_name)
+        collection.delete(ids=ids, where=where)
+        if FAISS_AVAILABLE:
+            _delete_faiss_index(collection_name)
+        return True
+    except Exception as e:
+        print(f"WARNING: Could not delete chunks from '{collection_name}': {e}")
+        return False
+
 def reset_collection(collection_name: str = DEFAULT_COLLECTION_NAME):
     try:
         print(f"INFO: Attempting to delete collection '{collection_name}'...")
-        CHROMA_CLIENT.delete_collection(name=collection_name)
+        _collection_cache.pop(collection_name, None)
+        _get_client().delete_collection(name=collection_name)
+        if FAISS_AVAILABLE:
+            _delete_faiss_index(collection_name)
         print(f"INFO: Collection '{collection_name}' deleted successfully.")
     except Exception as e:
         print(f"INFO: Collection '{collection_name}' not found for deletion, or other error during deletion: {e}")
     
 def get_collection_count(collection_name: str = DEFAULT_COLLECTION_NAME) -> int:
     try:
-        collection = CHROMA_CLIENT.get_collection(name=collection_name)
+        collection = _get_client().get_collection(name=collection_name)
         return collection.count()
     except:
         return 0
\ No newline at end of file